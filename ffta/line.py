@@ -6,10 +6,21 @@ __maintainer__ = "Durmus U. Karatay"
 __email__ = "ukaratay@uw.edu"
 __status__ = "Development"
 
+import multiprocessing
 import numpy as np
 from ffta import pixel
 
 
+def process_pixel(args):
+    """Wrapper function for pixel class, used in parallel processing."""
+
+    pixel_signal, params = args
+
+    p = pixel.Pixel(pixel_signal, params)
+
+    return p.analyze()
+
+
 class Line:
     """
     Signal Processing to Extract Time-to-First-Peak.
@@ -96,10 +107,18 @@ class Line:
 
         return
 
-    def analyze(self):
+    def analyze(self, processes=1):
         """
         Analyzes the line with the given method.
 
+        Parameters
+        ----------
+        processes : int, optional
+            Number of worker processes the pixels are distributed over.
+            Default 1 analyzes in this process, which is required when the
+            Line itself already runs inside a multiprocessing worker
+            (e.g. analyze.py -p).
+
         Returns
         -------
         tfp : (n_pixels,) array_like
@@ -111,15 +130,33 @@ class Line:
 
         """
 
-        # Split the signal array into pixels.
-        pixel_signals = np.split(self.signal_array, self.n_pixels, axis=1)
+        # Pixel already copies its input into a working buffer, so hand it
+        # views of the signal array rather than copying the line here.
+        pixel_signals = self._pixel_view()
+
+        if processes > 1:
+
+            # Each pixel is independent, so map them onto a pool of workers.
+            iterable = ((pixel_signals[:, i, :], self.params) for i in range(self.n_pixels))
+            with multiprocessing.Pool(processes=processes) as pool:
+                result = pool.map(process_pixel, iterable)
+
+            for i, pixel_result in enumerate(result):
 
-        # Iterate over pixels and return tFP and shift arrays.
-        for i, pixel_signal in enumerate(pixel_signals):
+                (self.tfp[i], self.shift[i], self.inst_freq[:, i]) = pixel_result
 
-            p = pixel.Pixel(pixel_signal, self.params)
-            
-            (self.tfp[i], self.shift[i], self.inst_freq[:, i]) = p.analyze()
+        else:
+
+            # One Pixel for the whole line, so its setup is done only once.
+            p = pixel.Pixel(pixel_signals[:, 0, :], self.params)
+
+            # Iterate over pixels and return tFP and shift arrays.
+            for i in range(self.n_pixels):
+
+                if i > 0:
+                    p.set_data(pixel_signals[:, i, :])
+
+                (self.tfp[i], self.shift[i], self.inst_freq[:, i]) = p.analyze()
 
         return (self.tfp, self.shift, self.inst_freq)
 
@@ -134,14 +171,19 @@ class Line:
             Returns signal_averaged time-domain signal at each pixel
         """
         
-        self.signal_avg_array = np.empty((self.signal_array.shape[0], self.n_pixels))
-                
-        for i in range(self.n_pixels):
-        
-            avg = self.signal_array[:, i*self.avgs_per_pixel:(i+1)*self.avgs_per_pixel]
-            self.signal_avg_array[:, i] = avg.mean(axis=1)
+        self.signal_avg_array = self._pixel_view().mean(axis=2)
         
         return self.signal_avg_array
+
+    def _pixel_view(self):
+        """
+        Signal array as (n_points, n_pixels, avgs_per_pixel), so that
+        [:, i, :] holds the signals of pixel i. This is a view unless
+        signal_array is not C-ordered (e.g. transposed for pycroscopy).
+        """
+
+        return self.signal_array.reshape(self.signal_array.shape[0], self.n_pixels,
+                                         self.avgs_per_pixel)
     
     def clear_filter_flags(self):
         """Removes flags from parameters for setting filters"""
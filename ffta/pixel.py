@@ -126,6 +126,8 @@ class Pixel:
     -------
     analyze()
         Analyzes signals and returns tfp, shift and inst_freq.
+    set_data(signal_array)
+        Replaces the signal, keeping the processing parameters.
 
     Notes
     -----
@@ -217,24 +219,8 @@ class Pixel:
         self.Q = 360
 
         # Set up the array
-        self.signal_array = signal_array
-        self.signal_orig = None  # used in amplitude calc to undo any Windowing beforehand
-
-        if len(signal_array.shape) == 2 and 1 not in signal_array.shape:
-            self.n_points, self.n_signals = self.signal_array.shape
-
-        else:
-            self.n_signals = 1
-            self.signal_array = self.signal_array.flatten()
-            self.n_points = self.signal_array.shape[0]
-        
-        self._n_points_orig = self.signal_array.shape[0]
-        
-        if pycroscopy:
-            self.signal_array = signal_array.T
-        
-        # The copy of the signal we will manipulate
-        self.signal = np.copy(self.signal_array)
+        self._pycroscopy = pycroscopy
+        self._set_signal_array(signal_array)
         
         # Read parameter attributes from parameters dictionary.
         for key, value in params.items():
@@ -284,7 +270,10 @@ class Pixel:
         self._tidx_orig = self.tidx
         self.tidx_orig = self.tidx
         
-        if not hasattr(self, 'drive_freq'):
+        # Remember whether drive_freq was given, for set_data
+        self._drive_freq_param = getattr(self, 'drive_freq', None)
+
+        if self._drive_freq_param is None:
             self.average()
             self.set_drive()
         
@@ -293,12 +282,7 @@ class Pixel:
             self.bandpass_filter = 0  # turns off FIR
 
         # Initialize attributes that are going to be assigned later.
-        self.signal = None
-        self.phase = None
-        self.inst_freq = None
-        self.tfp = None
-        self.shift = None
-        self.cwt_matrix = None
+        self._clear_results()
 
         # For accidental passing ancillary datasets from Pycroscopy, this will fail
         # when pickling
@@ -313,6 +297,77 @@ class Pixel:
 
         return
 
+    def _set_signal_array(self, signal_array):
+        """Sets signal_array and the sizes that follow from it."""
+
+        self.signal_array = signal_array
+        self.signal_orig = None  # used in amplitude calc to undo any Windowing beforehand
+
+        if len(signal_array.shape) == 2 and 1 not in signal_array.shape:
+            self.n_points, self.n_signals = self.signal_array.shape
+
+        else:
+            self.n_signals = 1
+            self.signal_array = self.signal_array.flatten()
+            self.n_points = self.signal_array.shape[0]
+        
+        self._n_points_orig = self.signal_array.shape[0]
+        
+        if self._pycroscopy:
+            self.signal_array = signal_array.T
+        
+        # The copy of the signal we will manipulate
+        self.signal = np.copy(self.signal_array)
+
+        return
+
+    def _clear_results(self):
+        """Initializes attributes that are assigned during analysis."""
+
+        self.signal = None
+        self.phase = None
+        self.inst_freq = None
+        self.tfp = None
+        self.shift = None
+        self.cwt_matrix = None
+
+        return
+
+    def set_data(self, signal_array):
+        """
+        Replaces the signal with a new one while keeping all processing
+        parameters, so one Pixel can analyze many pixels of the same line
+        (e.g. Line.analyze) without repeating the setup in __init__.
+        The FIR taps are kept as long as the filter band does not change.
+
+        Parameters
+        ----------
+        signal_array : (n_points, n_signals) array_like
+            2D real-valued signal array, must have the same n_points.
+        """
+
+        n_points = self._n_points_orig
+        self._set_signal_array(signal_array)
+
+        # Timing was validated in __init__; only the length has to match it
+        if self.n_points != n_points:
+            raise ValueError('signal_array must have the same n_points as the Pixel')
+
+        self.tidx = int(self.trigger * self.sampling_rate)
+        self._tidx_orig = self.tidx
+        self.tidx_orig = self.tidx
+
+        # check_drive_freq may have changed drive_freq for the previous signal
+        if self._drive_freq_param is None:
+            self.average()
+            self.set_drive()
+        else:
+            self.drive_freq = self._drive_freq_param
+
+        self._clear_results()
+
+        return
+
     def clear_filter_flags(self):
         """Removes flags from parameters for setting filters"""
 
@@ -442,14 +497,20 @@ class Pixel:
 
         band = [freq_low, freq_high]
 
-        # Create taps using window method.
-        try:
-            taps = sps.firwin(int(self.n_taps), band, pass_zero=False,
-                              window='blackman')
-        except:
-            print('band=', band)
-            print('nyq=', nyq_rate)
-            print('drive=', self.drive_freq)
+        # Create taps using window method, reusing them if the band is unchanged.
+        taps_key = (int(self.n_taps), freq_low, freq_high)
+        if getattr(self, '_taps_key', None) != taps_key:
+            try:
+                self._taps = sps.firwin(int(self.n_taps), band, pass_zero=False,
+                                        window='blackman')
+                self._taps_key = taps_key
+            except:
+                print('band=', band)
+                print('nyq=', nyq_rate)
+                print('drive=', self.drive_freq)
+                raise
+
+        taps = self._taps
 
         self.signal = sps.fftconvolve(self.signal, taps, mode='same')
 
@@ -0,0 +1,233 @@
+"""_ddho.py: Compiled kernels for the damped driven harmonic oscillator."""
+# pylint: disable=E1101,C0103
+__author__ = "Rajiv Giridharagopal"
+__copyright__ = "Copyright 2020, Ginger Lab"
+__email__ = "rgiri@uw.edu"
+__status__ = "Development"
+
+import numpy as np
+
+# numba is optional; without it the kernels below run as plain Python
+try:
+	from numba import njit
+	HAS_NUMBA = True
+except ImportError:
+	HAS_NUMBA = False
+
+	def njit(*args, **kwargs):
+		"""Stand-in for numba.njit when numba is not installed"""
+
+		if args and callable(args[0]):
+			return args[0]
+
+		return lambda func: func
+
+# numbalsoda is optional; without it Cantilever falls back to odeint
+try:
+	from numba import cfunc
+	from numbalsoda import lsoda, lsoda_sig
+except ImportError:
+	lsoda = None
+
+# The CyRK extension is only built when Cython and CyRK are available
+try:
+	from ._ddho_rhs import cyrk_solve, ddho_rhs_address
+except ImportError:
+	cyrk_solve = None
+
+if lsoda is not None:
+
+	@cfunc(lsoda_sig)
+	def lsoda_rhs(t, u, du, p):
+		"""
+		Derivative of the base DDHO, for numbalsoda.lsoda.
+
+		Parameters
+		----------
+		t : float
+			Time in seconds.
+		u : pointer to (2, ) float64
+			u[0] is the cantilever position, u[1] is the cantilever velocity.
+		du : pointer to (2, ) float64
+			Output, written in place.
+		p : pointer to (4, ) float64
+			[f0, wd, w0, q_factor], see Cantilever.ddho_params
+
+		"""
+
+		w0 = p[2]
+
+		du[0] = u[1]
+		du[1] = p[0] * np.sin(p[1] * t) - w0 * u[1] / p[3] - w0 * w0 * u[0]
+
+
+def build_lsoda_rhs(force_impl, omega_impl):
+	"""
+	Compiles a numbalsoda right-hand side from numba-compiled force and
+	resonance functions, force_impl(t, p) and omega_impl(t, p).
+
+	p is the parameter array handed to lsoda; p[3] must be q_factor,
+	as in Cantilever.ddho_params.
+	"""
+
+	@cfunc(lsoda_sig)
+	def rhs(t, u, du, p):
+
+		w = omega_impl(t, p)
+
+		du[0] = u[1]
+		du[1] = force_impl(t, p) - w * u[1] / p[3] - w * w * u[0]
+
+	return rhs
+
+
+def build_odeint_rhs(force_impl, omega_impl):
+	"""
+	Same as build_lsoda_rhs, for odeint: rhs(Z, t, p) with p passed as args.
+	"""
+
+	@njit
+	def rhs(Z, t, p):
+
+		w = omega_impl(t, p)
+
+		return (Z[1], force_impl(t, p) - w * Z[1] / p[3] - w * w * Z[0])
+
+	return rhs
+
+
+@njit(fastmath=True, cache=True)
+def _rk4_ddho_jit(z0, v0, t, f0, wd, w0, q):
+	"""
+	Fixed-step 4th order Runge-Kutta integration of the base DDHO.
+	The step is taken from t, so a uniform time axis gives a uniform step.
+
+	Parameters
+	----------
+	z0, v0 : float
+		Initial position and velocity.
+	t : (n_points, ) ndarray
+		Time axis, in seconds.
+	f0, wd, w0, q : float
+		Reduced driving force, radial drive frequency, radial resonance
+		frequency, and quality factor (see Cantilever).
+
+	Returns
+	-------
+	Z : (n_points, 2) ndarray
+		Position and velocity at each point of t.
+
+	"""
+
+	n = t.shape[0]
+	Z = np.empty((n, 2))
+
+	w0_sq = w0 * w0
+	w0_q = w0 / q
+
+	z = z0
+	v = v0
+	Z[0, 0] = z
+	Z[0, 1] = v
+
+	for i in range(1, n):
+
+		ti = t[i - 1]
+		dt = t[i] - ti
+		h = 0.5 * dt
+
+		# The drive at the midpoint is shared by k2 and k3
+		f_mid = f0 * np.sin(wd * (ti + h))
+
+		k1z = v
+		k1v = f0 * np.sin(wd * ti) - w0_q * v - w0_sq * z
+
+		k2z = v + h * k1v
+		k2v = f_mid - w0_q * k2z - w0_sq * (z + h * k1z)
+
+		k3z = v + h * k2v
+		k3v = f_mid - w0_q * k3z - w0_sq * (z + h * k2z)
+
+		k4z = v + dt * k3v
+		k4v = f0 * np.sin(wd * (ti + dt)) - w0_q * k4z - w0_sq * (z + dt * k3z)
+
+		z += dt / 6 * (k1z + 2 * k2z + 2 * k3z + k4z)
+		v += dt / 6 * (k1v + 2 * k2v + 2 * k3v + k4v)
+
+		Z[i, 0] = z
+		Z[i, 1] = v
+
+	return Z
+
+
+# Prefer the ahead-of-time build of the kernel above (see _kernels_aot),
+# which skips numba's compilation on first call. The JIT dispatcher keeps
+# its own name, since _kernels_aot compiles from its py_func.
+try:
+	from .ddho_kernels import rk4_ddho
+except ImportError:
+	rk4_ddho = _rk4_ddho_jit
+
+
+def analytic_ddho(z0, v0, t, f0, wd, w0, q, xp=np, velocity=True):
+	"""
+	Closed-form solution of the underdamped base DDHO (q > 0.5):
+	steady-state sinusoid plus an exponentially decaying transient
+	matched to the initial conditions at t[0].
+
+	The parameters may also be (M, 1) arrays, which evaluates M cantilevers
+	at once and broadcasts the result to (M, n_points, 2), or (M, n_points)
+	without velocity.
+
+	Parameters
+	----------
+	z0, v0 : float or (M, 1) array
+		Initial position and velocity at t[0].
+	t : (n_points, ) ndarray
+		Time axis, in seconds.
+	f0, wd, w0, q : float or (M, 1) array
+		Reduced driving force, radial drive frequency, radial resonance
+		frequency, and quality factor (see Cantilever).
+	xp : module, optional
+		Array module, numpy by default or cupy to evaluate on the GPU.
+	velocity : bool, optional
+		If False, only the position is evaluated, which skips the velocity
+		temporaries for large batches.
+
+	Returns
+	-------
+	Z : (n_points, 2) or (M, n_points, 2) ndarray
+		Position and velocity at each point of t. Position only, (n_points, )
+		or (M, n_points), if velocity is False.
+
+	"""
+
+	if xp.any(q <= 0.5):
+		raise ValueError('Closed form only covers the underdamped case (q_factor > 0.5)')
+
+	beta = w0 / (2 * q)
+	wdamp = xp.sqrt(w0 ** 2 - beta ** 2)
+
+	# Steady state z = amp * sin(wd * t - phi)
+	amp = f0 / xp.sqrt((w0 ** 2 - wd ** 2) ** 2 + 4 * beta ** 2 * wd ** 2)
+	phi = xp.arctan2(2 * beta * wd, w0 ** 2 - wd ** 2)
+
+	# Transient z = exp(-beta * tau) * (c1 * cos(wdamp * tau) + c2 * sin(wdamp * tau))
+	c1 = z0 - amp * xp.sin(wd * t[0] - phi)
+	c2 = (v0 - amp * wd * xp.cos(wd * t[0] - phi) + beta * c1) / wdamp
+
+	tau = t - t[0]
+	decay = xp.exp(-beta * tau)
+	cos_d = xp.cos(wdamp * tau)
+	sin_d = xp.sin(wdamp * tau)
+	arg = wd * t - phi
+
+	z = amp * xp.sin(arg) + decay * (c1 * cos_d + c2 * sin_d)
+
+	if not velocity:
+		return z
+
+	v = (amp * wd * xp.cos(arg) +
+		 decay * ((c2 * wdamp - beta * c1) * cos_d - (c1 * wdamp + beta * c2) * sin_d))
+
+	return xp.stack((z, v), axis=-1)
@@ -0,0 +1,102 @@
+# distutils: language = c++
+# cython: boundscheck=False, wraparound=False, cdivision=True, language_level=3
+"""_ddho_rhs.pyx: Cython right-hand side of the DDHO, integrated with CyRK."""
+
+from libc.math cimport sin
+from libc.stdint cimport uintptr_t
+from libc.string cimport memcpy
+from libcpp.vector cimport vector
+
+from CyRK cimport cysolve_ivp, CySolveOutput, ODEMethod, PreEvalFunc, DiffeqFuncType
+
+import numpy as np
+
+_METHODS = {'RK23': <int> ODEMethod.RK23,
+			'RK45': <int> ODEMethod.RK45,
+			'DOP853': <int> ODEMethod.DOP853}
+
+
+cdef void ddho_rhs(double* dy, double t, double* y, char* args,
+				   PreEvalFunc pre_eval_func) noexcept nogil:
+	"""
+	Derivative of the base DDHO, written in place.
+
+	args is a double array [f0, wd, w0, q_factor], see Cantilever.ddho_params
+	"""
+
+	cdef double* p = <double*> args
+	cdef double w0 = p[2]
+
+	dy[0] = y[1]
+	dy[1] = p[0] * sin(p[1] * t) - w0 * y[1] / p[3] - w0 * w0 * y[0]
+
+
+def ddho_rhs_address():
+	"""Address of the base DDHO right-hand side, for Cantilever.register_rhs"""
+
+	return <uintptr_t> ddho_rhs
+
+
+def cyrk_solve(uintptr_t rhs_address, double[::1] t, double[::1] Z0, double[::1] params,
+			   double rtol=1e-8, double atol=1e-10, str method='DOP853'):
+	"""
+	Integrates a DDHO right-hand side with CyRK's cysolve_ivp.
+
+	Parameters
+	----------
+	rhs_address : int
+		Address of a cdef function with CyRK's DiffeqFuncType signature,
+		e.g. ddho_rhs_address()
+	t : (n_points, ) ndarray
+		Time axis, integrated from t[0] to t[-1] and evaluated at every point.
+	Z0 : (2, ) ndarray
+		Initial position and velocity.
+	params : ndarray
+		float64 parameters handed to the right-hand side as args.
+	rtol, atol : float, optional
+		Relative and absolute tolerances.
+	method : str, optional
+		One of RK23, RK45, DOP853. DOP853 suits the smooth, non-stiff DDHO.
+
+	Returns
+	-------
+	Z : (n_points, 2) ndarray
+		Position and velocity at each point of t, NaN if the integration failed.
+	success : bool
+		Whether the integration succeeded.
+	message : str
+		Solver message.
+
+	"""
+
+	if method not in _METHODS:
+		raise ValueError('Invalid method! Valid options: ' + ', '.join(_METHODS))
+
+	cdef ODEMethod ode_method = <ODEMethod> (<int> _METHODS[method])
+	cdef size_t n = t.shape[0]
+	cdef size_t n_args = params.shape[0] * sizeof(double)
+	cdef vector[double] y0_vec = vector[double](2)
+	cdef vector[double] t_eval_vec = vector[double](n)
+	cdef vector[char] args_vec = vector[char](n_args)
+
+	y0_vec[0] = Z0[0]
+	y0_vec[1] = Z0[1]
+	memcpy(t_eval_vec.data(), &t[0], n * sizeof(double))
+	memcpy(args_vec.data(), &params[0], n_args)
+
+	# cysolve_ivp(diffeq, t_start, t_end, y0, method, rtol, atol, args, num_extra,
+	#			 max_num_steps, max_ram_MB, dense_output, t_eval)
+	cdef CySolveOutput result = cysolve_ivp(
+		<DiffeqFuncType> rhs_address, t[0], t[n - 1], y0_vec,
+		ode_method, rtol, atol, args_vec, 0, 0, 2000, False, t_eval_vec)
+
+	Z = np.empty((n, 2), dtype=np.float64)
+	cdef double[:, ::1] Z_view = Z
+
+	success = result.get().success
+	if success:
+		memcpy(&Z_view[0, 0], result.get().solution.data(), 2 * n * sizeof(double))
+	else:
+		Z.fill(np.nan)
+
+	return Z, success, result.get().message.decode()
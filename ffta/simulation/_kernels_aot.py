@@ -0,0 +1,38 @@
+"""_kernels_aot.py: Ahead-of-time build of the fixed-step DDHO kernel."""
+# pylint: disable=E1101,C0103
+__author__ = "Rajiv Giridharagopal"
+__copyright__ = "Copyright 2020, Ginger Lab"
+__email__ = "rgiri@uw.edu"
+__status__ = "Development"
+
+from numba.pycc import CC
+
+# setup.py loads this file by path, outside the package
+try:
+	from . import _ddho
+except ImportError:
+	import _ddho
+
+# Compiles to ffta.simulation.ddho_kernels, which _ddho imports in place of
+# the JIT kernel so the first simulate() call does not wait on numba
+cc = CC('ddho_kernels')
+
+_SIGNATURE = 'f8[:,:](f8,f8,f8[:],f8,f8,f8,f8)'
+
+cc.export('rk4_ddho', _SIGNATURE)(_ddho._rk4_ddho_jit.py_func)
+
+
+def extension():
+	"""
+	Setuptools extension for the precompiled kernel, built with the rest
+	of the package by build_ext.
+	"""
+
+	ext = cc.distutils_extension()
+	ext.name = 'ffta.simulation.ddho_kernels'
+
+	return ext
+
+
+if __name__ == '__main__':
+	cc.compile()
@@ -6,14 +6,103 @@ __maintainer__ = "Rajiv Giridharaogpal"
 __email__ = "rgiri@uw.edu"
 __status__ = "Production"
 
+import functools
+
 import numpy as np
-from scipy.integrate import odeint
+from scipy import signal as sps
+from scipy.integrate import odeint, solve_ivp
 
 import ffta
+from . import _ddho
 
 # Set constant 2 * pi.
 PI2 = 2 * float(np.pi)
 
+# Compiled right-hand sides, keyed by solver and then by Cantilever class.
+# Populated through Cantilever.register_rhs
+_compiled_rhs = {'cyrk': {}, 'lsoda': {}, 'njit': {}}
+
+# Order in which solver='auto' tries the compiled solvers before odeint
+_COMPILED_SOLVERS = ['cyrk', 'lsoda', 'njit']
+
+# Points per (chunk, n_points_sim) temporary in the batch simulations, 256 MB
+_BATCH_ELEMENTS = 2 ** 25
+
+# Largest h * |lambda| for which RK4 is stable on the negative real axis
+_RK4_STABILITY = 2.78
+
+# Solvers that only cover the base DDHO, kernel(z0, v0, t, f0, wd, w0, q)
+_BASE_KERNELS = {'analytic': _ddho.analytic_ddho,
+				 'rk4': _ddho.rk4_ddho}
+
+
+@functools.lru_cache(maxsize=32)
+def _output_axes(total_time, sampling_rate):
+	"""
+	Time and frequency axes of the simulated tip motion without extra cycles.
+	Cached so that sweeps over many Cantilevers share them; both are read-only.
+	"""
+
+	num_pts = int(total_time * sampling_rate)
+	t_Z = np.linspace(0, total_time, num=num_pts)
+	freq_Z = np.linspace(0, int(sampling_rate / 2), num=int(num_pts / 2 + 1))
+
+	t_Z.flags.writeable = False
+	freq_Z.flags.writeable = False
+
+	return t_Z, freq_Z
+
+
+def _decimate(Z, step, n_points, method='mean'):
+	"""
+	Reduces Z by the integer factor step and trims it to n_points.
+	See Cantilever.downsample for the methods.
+	"""
+
+	if method == 'mean':
+
+		return Z[:n_points * step].reshape(n_points, step).mean(axis=1)
+
+	elif method == 'fir':
+
+		return sps.decimate(Z, step, ftype='fir', zero_phase=True)[:n_points]
+
+	elif method == 'step':
+
+		return Z[0::step][:n_points]
+
+	raise ValueError('Invalid method! Valid options: mean, fir, step')
+
+
+def jit_rhs(cls):
+	"""
+	Class decorator that compiles the right-hand side of a Cantilever subclass
+	from numba-compatible force_impl(t, p) and omega_impl(t, p) staticmethods,
+	where p is the array returned by ddho_params (override it to append more
+	parameters; the first four entries are fixed). See Cantilever._build_njit_rhs
+
+	Examples
+	--------
+	>>> @jit_rhs
+	>>> class StepDrive(Cantilever):
+	>>>
+	>>> 	@staticmethod
+	>>> 	def force_impl(t, p):
+	>>> 		return p[0] * np.sin(p[1] * t) - (p[5] if t > p[4] else 0.0)
+	>>>
+	>>> 	@staticmethod
+	>>> 	def omega_impl(t, p):
+	>>> 		return p[2]
+	>>>
+	>>> 	def ddho_params(self):
+	>>> 		return np.append(super().ddho_params(), [self.t0, self.fe])
+	"""
+
+	cls._build_njit_rhs()
+
+	return cls
+
+
 
 class Cantilever:
 	"""Damped Driven Harmonic Oscillator Simulator for AFM Cantilevers.
@@ -25,6 +114,11 @@ class Cantilever:
 		omega(self, t)
 		dZdt(self, t) if the given ODE form will not work
 
+	Subclasses that also want to use a compiled solver (CyRK, numbalsoda) need to
+	supply their own compiled right-hand side via register_rhs, or numba-compatible
+	force_impl/omega_impl with the jit_rhs decorator; otherwise they are
+	integrated with odeint.
+
 	Parameters
 	----------
 	can_params : dict
@@ -73,15 +167,26 @@ class Cantilever:
 		ODE integration result, sampled at sampling_rate. Default integration
 		is at 100 MHz.
 	t_Z : ndarray
-		Time axis based on the provided total time and sampling rate
-	f_Z : ndarray
-		Frequency axis based on the provided sampling rate
+		Time axis based on the provided total time and sampling rate (read-only,
+		shared between instances with the same parameters)
+	freq_Z : ndarray
+		Frequency axis based on the provided sampling rate (read-only, shared)
 
 	Method
 	------
 	simulate(trigger_phase=180)
 		Simulates the cantilever motion with excitation happening
 		at the given phase.
+	simulate_analytic(trigger_phase=180)
+		Same, from the closed-form solution of the base DDHO.
+	simulate_batch(params_list, trigger_phase=180, chunk_size=None)
+		Simulates several base DDHOs in one closed-form evaluation.
+	simulate_and_analyze(target_rate=None, trigger_phase=180)
+		Simulates and returns tfp, shift and inst_freq without a Pixel.
+	simulate_batch_gpu(params_list, trigger_phase=180, chunk_size=None)
+		Same, from the closed-form solution on the GPU (requires cupy).
+	register_rhs(solver, rhs, pack)
+		Registers a compiled right-hand side for the class.
 
 	See Also
 	--------
@@ -101,6 +206,29 @@ class Cantilever:
 
 	"""
 
+	# Default seeding of the Pixel class-compatible parameters, see create_parameters
+	_DEFAULT_PARAMETERS = {'bandpass_filter': 1.0,
+						   'drive_freq': 277261,
+						   'filter_bandwidth': 10000.0,
+						   'n_taps': 799,
+						   'roi': 0.0003,
+						   'sampling_rate': 1e7,
+						   'total_time': 0.002,
+						   'trigger': 0.0005,
+						   'window': 'blackman',
+						   'wavelet_analysis': 0,
+						   'fft_params': {}}
+
+	_DEFAULT_CAN_PARAMS = {'amp_invols': 5.52e-08,
+						   'def_invols': 5.06e-08,
+						   'k': 26.2,
+						   'q_factor': 432}
+
+	_DEFAULT_FIT_PARAMS = {'filter_amplitude': True,
+						   'method': 'hilbert',
+						   'fit': True,
+						   'fit_form': 'product'}
+
 	def __init__(self, can_params, force_params, sim_params):
 
 		# Initialize cantilever parameters and calculate some others.
@@ -135,12 +263,8 @@ class Cantilever:
 		for key, value in sim_params.items():
 			setattr(self, key, value)
 
-		# Calculate time axis for simulated tip motion without extra cycles
-		num_pts = int(self.total_time * self.sampling_rate)
-		self.t_Z = np.linspace(0, self.total_time, num=num_pts)
-
-		# Calculate frequency axis for simulated tip_motion without extra cycles.
-		self.freq_Z = np.linspace(0, int(self.sampling_rate / 2), num=int(num_pts / 2 + 1))
+		# Time and frequency axes for simulated tip motion without extra cycles
+		self.t_Z, self.freq_Z = _output_axes(self.total_time, self.sampling_rate)
 
 		# Create a Pixel class-compatible params file
 		self.fit_params = {}
@@ -170,7 +294,7 @@ class Cantilever:
 		self.n_points_sim = cycle_points + self.n_points
 
 		# Create time vector and find the trigger wrt phase.
-		self.t = np.arange(self.n_points_sim) / self.sampling_rate
+		self.t = self._time_axis(self.n_points_sim)
 
 		# Current phase at trigger.
 		current_phase = np.mod(self.wd * self.trigger - self.delta, PI2)
@@ -186,6 +310,21 @@ class Cantilever:
 
 		return
 
+	def _time_axis(self, n_points):
+		"""
+		Simulation time vector of n_points at sampling_rate. The previous vector
+		is reused when neither changed, e.g. over repeated simulate() calls.
+		"""
+
+		key = (n_points, self.sampling_rate)
+		if getattr(self, '_t_key', None) != key:
+			# Scale in place: one allocation, and a multiply instead of a divide
+			self._t = np.arange(n_points, dtype=np.float64)
+			self._t *= 1 / self.sampling_rate
+			self._t_key = key
+
+		return self._t
+
 	def force(self, t, t0=0, tau=0):
 		"""
 		Force on the cantilever at a given time. 
@@ -247,14 +386,85 @@ class Cantilever:
 		t0 = self.t0
 		tau = self.tau
 
+		w = self.omega(t, t0, tau)
+
 		v = Z[1]
 		vdot = (self.force(t, t0, tau) -
-				self.omega(t, t0, tau) * Z[1] / self.q_factor -
-				self.omega(t, t0, tau) ** 2 * Z[0])
+				w * Z[1] / self.q_factor -
+				w * w * Z[0])
+
+		return (v, vdot)
+
+	@classmethod
+	def register_rhs(cls, solver, rhs, pack):
+		"""
+		Registers a compiled right-hand side used by simulate for this class.
+		Only the exact class is registered, so subclasses overriding force or
+		omega do not silently inherit the base DDHO.
 
-		return np.array([v, vdot])
+		Parameters
+		----------
+		solver : str
+			Solver the right-hand side is compiled for: 'cyrk', 'lsoda' or 'njit'.
+		rhs : object
+			For 'cyrk', the address (int) of a cdef function with CyRK's
+			DiffeqFuncType signature, see _ddho_rhs.pyx.
+			For 'lsoda', a numba cfunc with numbalsoda.lsoda_sig signature:
+			rhs(t, u, du, p)
+			For 'njit', a numba function rhs(Z, t, p) for odeint.
+			See also jit_rhs, which builds the last two.
+		pack : function
+			pack(self) returns the float64 parameter array passed to rhs as p.
 
-	def simulate(self, trigger_phase=180, Z0=None):
+		"""
+
+		if solver not in _compiled_rhs:
+			raise ValueError('Invalid solver! Valid options: ' + ', '.join(_compiled_rhs))
+
+		_compiled_rhs[solver][cls] = (rhs, pack)
+
+		return
+
+	@classmethod
+	def _build_njit_rhs(cls):
+		"""
+		Compiles force_impl and omega_impl of this class with numba and
+		registers the resulting right-hand side for 'lsoda' (when numbalsoda
+		is installed) and for 'njit', odeint on a numba function.
+		"""
+
+		if not _ddho.HAS_NUMBA:
+			raise ImportError('jit_rhs requires numba')
+
+		if not (hasattr(cls, 'force_impl') and hasattr(cls, 'omega_impl')):
+			raise AttributeError(cls.__name__ + ' must define force_impl and omega_impl')
+
+		force_impl = _ddho.njit(cls.force_impl)
+		omega_impl = _ddho.njit(cls.omega_impl)
+
+		if _ddho.lsoda is not None:
+			cls.register_rhs('lsoda', _ddho.build_lsoda_rhs(force_impl, omega_impl),
+							 cls.ddho_params)
+
+		cls.register_rhs('njit', _ddho.build_odeint_rhs(force_impl, omega_impl),
+						 cls.ddho_params)
+
+		return
+
+	def ddho_params(self):
+		"""
+		Packs the base DDHO parameters for the compiled right-hand sides.
+
+		Returns
+		-------
+		p : (4, ) ndarray
+			[f0, wd, w0, q_factor] as float64.
+
+		"""
+
+		return np.array([self.f0, self.wd, self.w0, self.q_factor], dtype=np.float64)
+
+	def simulate(self, trigger_phase=180, Z0=None, solver='auto', dtype=np.float64):
 		"""
 		Simulates the cantilever motion.
 
@@ -266,12 +476,31 @@ class Cantilever:
 			Z0 = [z0, v0], the initial position and velocity
 			If not specified, is calculated from the analytical solution to DDHO
 			(using "set_conditions")
+		solver : str, optional
+			ODE solver to use. One of
+				auto: analytic for the underdamped base Cantilever, otherwise
+					the first compiled solver registered for this class, else
+					odeint (overdamped runs are stiff, so no fixed step)
+				analytic: closed-form solution, base Cantilever only
+				odeint: scipy.integrate.odeint on dZ_dt, works for any subclass
+				dop853: scipy.integrate.solve_ivp DOP853 on dZ_dt, works for any
+					subclass; takes larger steps than odeint on the smooth DDHO
+				rk4: numba fixed-step RK4 at 1/sampling_rate, base Cantilever only;
+					raises ValueError if the step is outside RK4's stability limit
+				cyrk: CyRK cysolve_ivp (DOP853) on a Cython right-hand side
+				lsoda: numbalsoda.lsoda on a compiled right-hand side (see register_rhs)
+				njit: odeint on a numba right-hand side (see jit_rhs)
+		dtype : numpy dtype, optional
+			Storage type of the output; the integration itself is always float64.
+			np.float32 halves memory for large sweeps, but the phase unwrapped in
+			Pixel then loses resolution, so keep float64 for tFP analysis.
 		Returns
 		-------
 		Z : (n_points, 1) array_like
 			Cantilever position in Volts.
 		infodict : dict
-			Information about the ODE solver.
+			Information about the ODE solver. A RuntimeError is raised instead
+			if a solver reporting success (dop853, cyrk, lsoda) fails.
 
 		"""
 
@@ -283,40 +512,373 @@ class Cantilever:
 				raise ValueError('Must specify exactly [z0, v0]')
 
 			self.n_points = int(self.total_time * self.sampling_rate)
-			self.t = np.arange(self.n_points) / self.sampling_rate
+			self.t = self._time_axis(self.n_points)
 			self.t0 = self.trigger
 			self.Z0 = Z0
 
 		else:
 			self.set_conditions(trigger_phase)
 
-		Z, infodict = odeint(self.dZ_dt, self.Z0, self.t, full_output=True)
+		if solver == 'auto':
+
+			solver = 'odeint'
+			if type(self) is Cantilever and self.q_factor > 0.5:
+				solver = 'analytic'
+			else:
+				for _solver in _COMPILED_SOLVERS:
+					if type(self) in _compiled_rhs[_solver]:
+						solver = _solver
+						break
+
+		if solver == 'odeint':
+
+			Z, infodict = odeint(self.dZ_dt, self.Z0, self.t, full_output=True)
+
+		elif solver == 'dop853':
+
+			sol = solve_ivp(lambda t, Z: self.dZ_dt(Z, t), (self.t[0], self.t[-1]), self.Z0,
+							method='DOP853', t_eval=self.t, rtol=1e-8, atol=1e-10)
+			Z = sol.y.T
+			infodict = {'success': sol.success, 'message': sol.message, 'nfev': sol.nfev}
+
+		elif solver in _BASE_KERNELS:
+
+			if type(self) is not Cantilever:
+				raise ValueError(solver + ' only integrates the base Cantilever DDHO')
+
+			if solver == 'rk4':
+
+				# Largest eigenvalue of the DDHO, w0 when underdamped and about
+				# w0 / q_factor when strongly overdamped
+				beta = self.w0 / (2 * self.q_factor)
+				lam = max(self.w0, beta + np.sqrt(max(beta ** 2 - self.w0 ** 2, 0)))
+				if lam / self.sampling_rate > _RK4_STABILITY:
+					raise ValueError('rk4 is unstable at this sampling_rate and q_factor; '
+									 'use odeint, cyrk or lsoda')
+
+			kernel = _BASE_KERNELS[solver]
+			Z = kernel(self.Z0[0], self.Z0[1], self.t, self.f0, self.wd,
+					   self.w0, self.q_factor)
+			infodict = {'success': bool(np.all(np.isfinite(Z)))}
+			if not infodict['success']:
+				infodict['message'] = 'non-finite output'
+
+		elif solver in _compiled_rhs:
+
+			if type(self) not in _compiled_rhs[solver]:
+				raise ValueError('No ' + solver + ' right-hand side registered for '
+								 + type(self).__name__)
+
+			rhs, pack = _compiled_rhs[solver][type(self)]
+
+			if solver == 'cyrk':
+
+				Z, success, message = _ddho.cyrk_solve(rhs, self.t,
+													   np.asarray(self.Z0, dtype=np.float64),
+													   pack(self), rtol=1e-8, atol=1e-10)
+				infodict = {'success': success, 'message': message}
+
+			elif solver == 'lsoda':
+
+				Z, success = _ddho.lsoda(rhs.address, np.asarray(self.Z0, dtype=np.float64),
+										 self.t, data=pack(self), rtol=1e-8, atol=1e-10)
+				infodict = {'success': success}
+
+			elif solver == 'njit':
+
+				Z, infodict = odeint(rhs, self.Z0, self.t, args=(pack(self),),
+									 full_output=True)
+
+		else:
+
+			raise ValueError('Invalid solver! Valid options: auto, analytic, odeint, dop853, rk4, '
+							 + ', '.join(_compiled_rhs))
+
+		if not infodict.get('success', True):
+			raise RuntimeError(solver + ' integration failed: '
+							   + str(infodict.get('message', 'no message')))
 
 		t0_idx = int(self.t0 * self.sampling_rate)
 		tidx = int(self.trigger * self.sampling_rate)
 		Z_cut = Z[(t0_idx - tidx):(t0_idx + self.n_points - tidx), 0]
 
 		self.infodict = infodict
-		self.Z = Z_cut
+		self.Z = Z_cut.astype(dtype, copy=False)
 		return self.Z, self.infodict
 
-	def downsample(self, target_rate=1e7):
+	@classmethod
+	def simulate_batch(cls, params_list, trigger_phase=180, chunk_size=None):
+		"""
+		Simulates several base DDHO cantilevers at once, e.g. for parameter
+		sweeps, by evaluating the closed-form solution on (M, 1) parameter
+		arrays. Only covers the underdamped case (q_factor > 0.5).
+
+		Parameters
+		----------
+		params_list : list
+			(can_params, force_params, sim_params) for each cantilever, as
+			returned by load.simulation_configuration. All of them must share
+			trigger, total_time and sampling_rate.
+		trigger_phase: float, optional
+		   Trigger phase is in degrees and wrt cosine. Default value is 180.
+		chunk_size : int, optional
+			Number of cantilevers evaluated together, which bounds the size of
+			the (chunk_size, n_points_sim) temporaries. Defaults to about
+			_BATCH_ELEMENTS points per temporary.
+
+		Returns
+		-------
+		Z : (n_points, M) ndarray
+			Cantilever positions, one column per entry of params_list, as in
+			simulate.
+		infodict : dict
+			Information about the solver, as in simulate.
+
+		"""
+
+		Z = cls._batch_positions(params_list, trigger_phase, chunk_size, np)
+
+		return Z, {'success': True}
+
+	@classmethod
+	def simulate_batch_gpu(cls, params_list, trigger_phase=180, chunk_size=None):
+		"""
+		Same as simulate_batch, but evaluates the closed-form solution of all
+		cantilevers on the GPU with CuPy. Meant for large sweeps (thousands
+		of cantilevers); the result stays on the device so that it can go
+		straight into cupy.fft, use .get() to copy it to the host.
+
+		Parameters
+		----------
+		params_list : list
+			See simulate_batch.
+		trigger_phase: float, optional
+		   Trigger phase is in degrees and wrt cosine. Default value is 180.
+		chunk_size : int, optional
+			See simulate_batch; lower it if the GPU runs out of memory.
+
+		Returns
+		-------
+		Z : (n_points, M) cupy.ndarray
+			Cantilever positions, one column per entry of params_list.
+
+		"""
+
+		try:
+			import cupy as cp
+		except ImportError:
+			raise ImportError('simulate_batch_gpu requires cupy')
+
+		return cls._batch_positions(params_list, trigger_phase, chunk_size, cp)
+
+	@classmethod
+	def _batch_positions(cls, params_list, trigger_phase, chunk_size, xp):
+		"""
+		Closed-form positions of a batch, evaluated chunk_size cantilevers at
+		a time with the array module xp and cut at each cantilever's trigger.
+		Returns an (n_points, M) array of xp.
+		"""
+
+		cants, t, params, Y0, offsets = cls._batch_conditions(params_list, trigger_phase)
+
+		M = len(cants)
+		n_points = cants[0].n_points
+
+		if chunk_size is None:
+			chunk_size = max(1, _BATCH_ELEMENTS // len(t))
+
+		F0, WD, W0, Q = [xp.asarray(p).reshape(M, 1) for p in params]
+		z0 = xp.asarray(Y0[:M]).reshape(M, 1)
+		v0 = xp.asarray(Y0[M:]).reshape(M, 1)
+		t = xp.asarray(t)
+
+		offsets = xp.asarray(offsets).reshape(M, 1)
+		cols = xp.arange(n_points)
+
+		Z = xp.empty((M, n_points))
+
+		for i in range(0, M, chunk_size):
+
+			s = slice(i, i + chunk_size)
+			Z_chunk = _ddho.analytic_ddho(z0[s], v0[s], t, F0[s], WD[s], W0[s], Q[s],
+										  xp=xp, velocity=False)
+
+			# Cut each cantilever at its own trigger, as in simulate
+			Z[s] = xp.take_along_axis(Z_chunk, offsets[s] + cols, axis=1)
+
+		return Z.T
+
+	@classmethod
+	def _batch_conditions(cls, params_list, trigger_phase):
+		"""
+		Sets up the cantilevers of a batch simulation.
+
+		Returns
+		-------
+		cants : list
+			Cantilever for each entry of params_list, after set_conditions.
+		t : (n_points_sim, ) ndarray
+			Longest simulation time vector (lowest res_freq) of the batch.
+		params : list
+			[F0, WD, W0, Q], each a (M, ) array of Cantilever.ddho_params.
+		Y0 : (2M, ) ndarray
+			Stacked initial conditions [z_1..z_M, v_1..v_M].
+		offsets : (M, ) ndarray
+			Index into t where each cantilever's output starts.
+		"""
+
+		if cls is not Cantilever:
+			raise ValueError('Batch simulation only integrates the base Cantilever DDHO')
+
+		cants = [cls(*params) for params in params_list]
+		for c in cants:
+			c.set_conditions(trigger_phase)
+
+		first = cants[0]
+		for c in cants[1:]:
+			if (c.trigger, c.total_time, c.sampling_rate) != \
+					(first.trigger, first.total_time, first.sampling_rate):
+				raise ValueError('All cantilevers must share trigger, total_time and sampling_rate')
+
+		t = max(cants, key=lambda c: c.n_points_sim).t
+
+		params = [np.array(p) for p in zip(*[c.ddho_params() for c in cants])]
+		Y0 = np.array([c.Z0[0] for c in cants] + [c.Z0[1] for c in cants])
+
+		tidx = int(first.trigger * first.sampling_rate)
+		offsets = np.array([int(c.t0 * c.sampling_rate) - tidx for c in cants])
+
+		return cants, t, params, Y0, offsets
+
+	def simulate_analytic(self, trigger_phase=180, Z0=None, dtype=np.float64):
+		"""
+		Simulates the base DDHO from its closed-form solution instead of
+		integrating the ODE. See simulate for parameters and returns.
+		"""
+
+		return self.simulate(trigger_phase, Z0, solver='analytic', dtype=dtype)
+
+	def simulate_and_analyze(self, target_rate=None, trigger_phase=180, solver='auto',
+							 method='mean'):
+		"""
+		Simulates and extracts tFP and frequency shift in one pass, without
+		building a Pixel. Follows the unfitted Hilbert path of Pixel.analyze
+		(fit=False): DC removal, window, FIR bandpass around drive_freq,
+		Hilbert transform, Savitzky-Golay derivative of the unwrapped phase,
+		and the minimum within roi of the trigger. The minimum is taken from
+		the samples directly rather than from a spline.
+
+		Parameters
+		----------
+		target_rate : float, optional
+			Sampling rate the output is decimated to before the analysis.
+			Defaults to the simulation sampling_rate.
+		trigger_phase: float, optional
+		   Trigger phase is in degrees and wrt cosine. Default value is 180.
+		solver : str, optional
+			See simulate.
+		method : str, optional
+			Decimation method for target_rate, see downsample.
+
+		Returns
+		-------
+		tfp : float
+			Time from trigger to first-peak, in seconds.
+		shift : float
+			Frequency shift from trigger to first-peak, positive for a drop
+			as in Pixel.shift, in the units of Pixel.inst_freq.
+		inst_freq : (n_points,) ndarray
+			Instantaneous frequency relative to the trigger, as in Pixel.inst_freq.
+
+		Examples
+		--------
+		>>> c = mechanical_drive.MechanicalDrive(*params)
+		>>> tfp, shift, _ = c.simulate_and_analyze()
+		>>> pix = c.analyze(plot=False, fit=False)
+		>>> np.isclose(tfp, pix.tfp, atol=1e-6), np.isclose(shift, pix.shift, rtol=1e-2)
+		(True, True)
+
+		"""
+
+		Z, _ = self.simulate(trigger_phase, solver=solver)
+
+		rate = self.sampling_rate
+		if target_rate:
+			if target_rate > self.sampling_rate:
+				raise ValueError('Target should be less than the initial sampling rate')
+			step = int(self.sampling_rate / target_rate)
+			rate = self.sampling_rate / step
+			Z = _decimate(Z, step, int(self.total_time * rate), method)
+
+		n_points = Z.shape[0]
+		tidx = int(self.trigger * rate)
+		ridx = int(self.parameters['roi'] * rate)
+
+		signal = Z - Z.mean()
+
+		if self.parameters['window'] != 0:
+			signal = signal * sps.get_window(self.parameters['window'], n_points)
+
+		delay = 0
+		if self.parameters['bandpass_filter'] == 1:
+
+			# Same band as Pixel.fir_filter, with the taps scaled to keep
+			# their length in time at a lower rate
+			nyq_rate = 0.5 * rate
+			bw_half = self.parameters['filter_bandwidth'] / 2
+			band = [(self.parameters['drive_freq'] - bw_half) / nyq_rate,
+					(self.parameters['drive_freq'] + bw_half) / nyq_rate]
+
+			n_taps = int(self.parameters['n_taps'] * rate / self.sampling_rate)
+			n_taps += 1 - n_taps % 2
+			taps = sps.firwin(n_taps, band, pass_zero=False, window='blackman')
+
+			signal = sps.fftconvolve(signal, taps, mode='same')
+			delay = (n_taps - 1) // 2
+
+		phase = np.unwrap(np.angle(sps.hilbert(signal)))
+		inst_freq = sps.savgol_filter(phase, 5, 1, deriv=1, delta=1 / rate)
+
+		# As in Pixel, the filter is taken as causal: delaying by half its length
+		# keeps the response smeared ahead of the trigger out of the reference
+		inst_freq = np.pad(inst_freq, (delay, 0), 'edge')[:n_points]
+		inst_freq -= inst_freq[tidx]
+
+		peak = np.argmin(inst_freq[tidx:tidx + ridx])
+		tfp = peak / rate
+		shift = -inst_freq[tidx + peak]
+
+		return tfp, shift, inst_freq
+
+	def downsample(self, target_rate=1e7, method='mean'):
 		'''
 		Downsamples the cantilever output. Used primarily to match experiments
 		or for lower computational load
 		
-		This will overwrite the existing output with the downsampled verison
+		This will overwrite the existing output with the downsampled verison,
+		keeping its dtype
 		
 		target_rate : int
 			The sampling rate for the signal to be converted to. 1e7 = 10 MHz
+			It must divide sampling_rate evenly.
+		method : str, optional
+			How samples are combined. One of
+				mean: average over each block of samples (default)
+				fir: scipy.signal.decimate with a zero-phase FIR anti-alias filter
+				step: keep every n-th sample, no anti-aliasing
 		'''
 
 		if target_rate > self.sampling_rate:
 			raise ValueError('Target should be less than the initial sampling rate')
 		step = int(self.sampling_rate / target_rate)
+		if not np.isclose(step * target_rate, self.sampling_rate):
+			raise ValueError('Target rate must divide the sampling rate evenly')
 		n_points = int(self.total_time * target_rate)
 
-		self.Z = self.Z[0::step].reshape(n_points, 1) / self.def_invols
+		Z = _decimate(self.Z, step, n_points, method)
+
+		# Keep the storage type chosen in simulate
+		self.Z = (Z.reshape(n_points, 1) / self.def_invols).astype(self.Z.dtype, copy=False)
 
 		return
 
@@ -337,55 +899,27 @@ class Cantilever:
 			Contains various parameters for fitting and analysis. See Pixel class.
 		'''
 
-		# default seeding of parameters
-		_parameters = {'bandpass_filter': 1.0,
-					   'drive_freq': 277261,
-					   'filter_bandwidth': 10000.0,
-					   'n_taps': 799,
-					   'roi': 0.0003,
-					   'sampling_rate': 1e7,
-					   'total_time': 0.002,
-					   'trigger': 0.0005,
-					   'window': 'blackman',
-					   'wavelet_analysis': 0,
-                       'fft_params': {}}
-
-		_can_params = {'amp_invols': 5.52e-08,
-					   'def_invols': 5.06e-08,
-					   'k': 26.2,
-					   'q_factor': 432}
-
-		_fit_params = {'filter_amplitude': True,
-					   'method': 'hilbert',
-					   'fit': True,
-					   'fit_form': 'product'
-                       }
-
-		for key, val in _parameters.items():
-			if key not in params:
-				if hasattr(self, key):
-					params[key] = self.__dict__[key]
-				else:
-					params[key] = val
+		# Keys not given explicitly come from the instance, else the defaults;
+		# dict defaults (fft_params) are copied so no two instances share one.
+		for target, defaults, given in [(self.parameters, self._DEFAULT_PARAMETERS, params),
+										(self.can_params, self._DEFAULT_CAN_PARAMS, can_params),
+										(self.fit_params, self._DEFAULT_FIT_PARAMS, fit_params)]:
 
-		for key, val in _can_params.items():
-			if key not in can_params:
-				if hasattr(self, key):
-					can_params[key] = self.__dict__[key]
-				else:
-					can_params[key] = val
+			merged = {}
+			for key, val in defaults.items():
+
+				if key in given:
+					continue
 
-		for key, val in _fit_params.items():
-			if key not in fit_params:
 				if hasattr(self, key):
-					fit_params[key] = self.__dict__[key]
+					merged[key] = getattr(self, key)
 				else:
-					fit_params[key] = val
+					merged[key] = val.copy() if isinstance(val, dict) else val
+
+			merged.update(given)
 
-		# then write to the Class
-		self.parameters.update(**params)
-		self.can_params.update(**can_params)
-		self.fit_params.update(**fit_params)
+			# then write to the Class
+			target.update(merged)
 
 		return
 
@@ -404,24 +938,16 @@ class Cantilever:
 		pix : Pixel object
 
 		'''
-		param_keys = ['bandpass_filter', 'drive_freq', 'filter_bandwidth', 'n_taps',
-					  'roi', 'sampling_rate', 'total_time', 'trigger', 'window', 'wavelet_analysis',
-                      'fft_params']
-
-		can_param_keys = ['amp_invols', 'def_invols', 'k', 'q_factor']
-
-		fit_param_keys = ['filter_amplitude', 'method', 'fit', 'fit_form']
-
 		params = {}
 		can_params = {}
 		fit_params = {}
 
 		for k, v in kwargs.items():
-			if k in param_keys:
+			if k in self._DEFAULT_PARAMETERS:
 				params[k] = v
-			elif k in can_param_keys:
+			elif k in self._DEFAULT_CAN_PARAMS:
 				can_params[k] = v
-			elif k in fit_param_keys:
+			elif k in self._DEFAULT_FIT_PARAMS:
 				fit_params[k] = v
 
 		self.create_parameters(params, can_params, fit_params)
@@ -434,3 +960,10 @@ class Cantilever:
 			pix.plot()
 
 		return pix
+
+
+if _ddho.cyrk_solve is not None:
+	Cantilever.register_rhs('cyrk', _ddho.ddho_rhs_address(), Cantilever.ddho_params)
+
+if _ddho.lsoda is not None:
+	Cantilever.register_rhs('lsoda', _ddho.lsoda_rhs, Cantilever.ddho_params)
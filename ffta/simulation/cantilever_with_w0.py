@@ -184,9 +184,11 @@ class MechanicalDrive_Simple(Cantilever):
         t0 = self.t0
         tau = self.tau
 
+        w = self.omega(t)
+
         v = Z[1]
         vdot = (self.force(t, t0, tau) -
-                self.omega(t) * Z[1] / self.q_factor -
-                self.omega(t) ** 2 * Z[0])
+                w * Z[1] / self.q_factor -
+                w * w * Z[0])
 
-        return np.array([v, vdot])
\ No newline at end of file
+        return (v, vdot)
\ No newline at end of file
@@ -287,7 +287,7 @@ class ElectricDrive(Cantilever):
 		self.n_points_sim = cycle_points + self.n_points
 
 		# Create time vector and find the trigger wrt phase.
-		self.t = np.arange(self.n_points_sim) / self.sampling_rate
+		self.t = self._time_axis(self.n_points_sim)
 
 		# Current phase at trigger.
 		current_phase = np.mod(self.wd * self.trigger - self.delta, PI2)
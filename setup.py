@@ -1,10 +1,40 @@
-from setuptools import setup, find_packages
+from setuptools import setup, find_packages, Extension
 
 from os import path
 this_directory = path.abspath(path.dirname(__file__))
 with open(path.join(this_directory, 'README.md'), encoding='utf-8') as f:
     long_description = f.read()
 
+# The compiled DDHO solvers below are optional; each is only built when its
+# dependencies are importable at build time. pip's default isolated build has
+# none of them, so the JIT/odeint fallbacks are the default; use
+# pip install --no-build-isolation .[sim] to build them (see README.md).
+
+# The CyRK right-hand side of the DDHO simulation.
+try:
+    import numpy
+    import CyRK
+    from Cython.Build import cythonize
+
+    ext_modules = cythonize([Extension('ffta.simulation._ddho_rhs',
+                                       ['ffta/simulation/_ddho_rhs.pyx'],
+                                       include_dirs=[numpy.get_include()] + CyRK.get_include())])
+except ImportError:
+    ext_modules = []
+
+# The RK4 DDHO kernel, precompiled with numba.pycc so the installed package
+# does not JIT it on first use.
+try:
+    import sys
+    sys.path.insert(0, path.join(this_directory, 'ffta', 'simulation'))
+    import _kernels_aot
+
+    ext_modules.append(_kernels_aot.extension())
+except ImportError:
+    pass
+finally:
+    sys.path.pop(0)
+
 setup(
     name='FFTA',
     version='0.4',
@@ -18,6 +48,7 @@ setup(
 	url='https://github.com/rajgiriUW/ffta/',
 
     packages=find_packages(exclude=['xop', 'docs', 'data', 'notebooks']),
+    ext_modules=ext_modules,
 
     install_requires=['numpy>=1.18.1',
                       'scipy>=1.4.1',
@@ -29,6 +60,12 @@ setup(
                       'pywavelets>=1.1.1',
                       'sidpy>=0.0.2'],
 
+    # Optional compiled ODE solvers for ffta.simulation
+    extras_require={'sim': ['numba>=0.50',
+                            'numbalsoda>=0.3',
+                            'cython>=3.0',
+                            'CyRK>=0.19']},
+
     # entry_points={
     #      'console_scripts': [
     #          'ffta-analyze = ffta.analyze:main',